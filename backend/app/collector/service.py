@@ -5,24 +5,62 @@ import csv
 import logging
 import os
 import signal
+import time
 from dataclasses import dataclass
 from datetime import datetime
 from typing import Optional
 
 from dateutil import parser as dateutil_parser
-from sqlalchemy import select
-from sqlalchemy.exc import IntegrityError
+
+try:  # optional C parser, fastest for rtlamr's RFC3339 timestamps
+    import ciso8601
+except ImportError:  # pragma: no cover - optional dependency
+    ciso8601 = None
+
+from sqlalchemy import insert, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..config import get_settings
 from ..filter_config import read_filter_ids
 from ..database import get_engine, get_session_factory
 from ..models import Meter, RawReading
+from ..usage import SQL_WINDOW_FUNCTIONS, catch_up_rollup
 
 
 logger = logging.getLogger("power_monitor.collector")
 logging.basicConfig(level=logging.INFO)
 
+# Readings are committed in batches: up to BATCH_SIZE readings, or whatever
+# arrived within BATCH_TIMEOUT_S of the first reading in the batch.
+BATCH_SIZE = 100
+BATCH_TIMEOUT_S = 0.5
+
+# rtlamr stdout is read in chunks of up to this many bytes and split into lines locally
+READ_CHUNK_SIZE = 65536
+
+# rtl_tcp port polling: starts at PORT_POLL_INITIAL_S and doubles per attempt
+PORT_POLL_INITIAL_S = 0.1
+PORT_WAIT_TIMEOUT_S = 10.0
+
+# rtlamr restart delay: starts at RESTART_BACKOFF_INITIAL_S and doubles with each
+# consecutive failure, up to RESTART_BACKOFF_MAX_S
+RESTART_BACKOFF_INITIAL_S = 0.25
+RESTART_BACKOFF_MAX_S = 30.0
+# A run that lasted at least this long counts as healthy and resets the backoff
+RESTART_HEALTHY_RUN_S = 60.0
+
+# meter_ids known to exist in the meters table; only unseen ids are inserted
+_known_meter_ids: set[str] = set()
+
+# Earliest reading per meter written since the last intervals rollup refresh
+_rollup_pending: dict[str, datetime] = {}
+
+# Built once and executed with a list of parameter dicts (executemany), so the
+# hot insert path skips the ORM unit of work and reuses SQLAlchemy's compiled form.
+# Table-level (not ORM-entity) inserts, so the result carries the cursor rowcount.
+_INSERT_METER = insert(Meter.__table__).prefix_with("OR IGNORE")
+_INSERT_RAW = insert(RawReading.__table__).prefix_with("OR IGNORE")
+
 
 @dataclass
 class ParsedReading:
@@ -31,35 +69,65 @@ class ParsedReading:
     cumulative_raw: int
 
 
+def _parse_timestamp(ts_raw: str) -> datetime:
+    """Parse an RFC3339 timestamp, trying the cheapest parser first."""
+    if ciso8601 is not None:
+        try:
+            return ciso8601.parse_datetime(ts_raw)
+        except ValueError:
+            pass
+    try:
+        # Python 3.11+ accepts "Z" and nanosecond fractions natively
+        return datetime.fromisoformat(ts_raw)
+    except ValueError:
+        pass
+    if len(ts_raw) == 35:
+        # Nanoseconds + offset ("...T21:22:23.665421351-05:00"): keep 6 fractional
+        # digits for fromisoformat on older Pythons
+        try:
+            return datetime.fromisoformat(ts_raw[:26] + ts_raw[-6:])
+        except ValueError:
+            pass
+    # dateutil handles anything else, at a much higher per-call cost
+    return dateutil_parser.isoparse(ts_raw)
+
+
 def parse_rtlamr_csv_line(line: str) -> Optional[ParsedReading]:
     line = line.strip()
     if not line:
         return None
-    # Skip rtlamr's internal log/debug lines (mixed with CSV on stdout)
-    if ".go:" in line or "decode.go" in line or "main.go" in line:
+    # Skip rtlamr's internal log/debug lines (mixed with CSV on stdout), which
+    # all carry a "file.go:line" source location
+    if ".go:" in line:
         return None
-    try:
-        row = next(csv.reader([line]))
-    except Exception as exc:  # pragma: no cover - defensive
-        logger.warning("Failed to parse CSV line: %s (%s)", line, exc)
-        return None
-
-    # rtlamr -format=csv outputs data lines with 8+ columns; log/debug lines have fewer
+    if '"' in line:
+        # rtlamr never quotes its fields; only pay for the csv module if it does
+        try:
+            row = next(csv.reader([line]))
+        except Exception as exc:  # pragma: no cover - defensive
+            logger.warning("Failed to parse CSV line: %s (%s)", line, exc)
+            return None
+    else:
+        # Nothing past column 7 is needed, so stop splitting there
+        row = line.split(",", 8)
+
+    # rtlamr -format=csv outputs data lines with 8+ columns; log/debug lines have
+    # fewer. Check up front rather than raising, since noise lines are common.
     if len(row) < 8:
         return None
+    # At most one sign: "--5" must be rejected here, not raise in int()
+    digits = row[7][1:] if row[7].startswith("-") else row[7]
+    if not digits.isdecimal():
+        return None
 
     # Expected columns (indices based on sample):
     # 0: timestamp, 3: meter_id, 7: cumulative_raw
-    try:
-        ts_raw = row[0]
-        meter_id = row[3]
-        cumulative_raw = int(row[7])
-    except (IndexError, ValueError):
-        return None
+    ts_raw = row[0]
+    meter_id = row[3]
+    cumulative_raw = int(row[7])
 
     try:
-        # dateutil handles nanosecond fractions and timezone offsets
-        timestamp = dateutil_parser.isoparse(ts_raw)
+        timestamp = _parse_timestamp(ts_raw)
     except Exception as exc:  # pragma: no cover - defensive
         logger.warning("Failed to parse timestamp %s (%s)", ts_raw, exc)
         return None
@@ -67,30 +135,166 @@ def parse_rtlamr_csv_line(line: str) -> Optional[ParsedReading]:
     return ParsedReading(timestamp=timestamp, meter_id=meter_id, cumulative_raw=cumulative_raw)
 
 
-async def persist_reading(session: AsyncSession, reading: ParsedReading) -> None:
+async def persist_batch(session: AsyncSession, readings: list[ParsedReading]) -> None:
+    """Write a batch of readings in one transaction; duplicates are ignored.
+
+    The meters written are queued for the intervals rollup
+    (refresh_pending_rollup); the batch never waits on it.
+    """
+    if not readings:
+        return
     if get_settings().import_lock_path.exists():
-        logger.debug("Import in progress, skipping write")
+        logger.debug("Import in progress, skipping write of %d readings", len(readings))
         return
-    meter = (
-        await session.execute(select(Meter).where(Meter.meter_id == reading.meter_id))
-    ).scalar_one_or_none()
-    if meter is None:
-        meter = Meter(meter_id=reading.meter_id, label=None, active=False)
-        session.add(meter)
-
-    model = RawReading(
-        meter_id=reading.meter_id,
-        timestamp=reading.timestamp,
-        cumulative_raw=reading.cumulative_raw,
-        cumulative_kwh=reading.cumulative_raw / 100.0,
-        source="rtlamr",
+    # First-seen order, so meters.id keeps following discovery order
+    new_meter_ids = [
+        mid for mid in dict.fromkeys(r.meter_id for r in readings)
+        if mid not in _known_meter_ids
+    ]
+    # One BEGIN/COMMIT per batch; OR IGNORE means there is no rollback path
+    async with session.begin():
+        if new_meter_ids:
+            await session.execute(
+                _INSERT_METER,
+                [{"meter_id": mid, "label": None, "active": False} for mid in new_meter_ids],
+            )
+        result = await session.execute(
+            _INSERT_RAW,
+            [
+                {
+                    "meter_id": r.meter_id,
+                    "timestamp": r.timestamp,
+                    "cumulative_raw": r.cumulative_raw,
+                    "cumulative_kwh": r.cumulative_raw / 100.0,
+                    "source": "rtlamr",
+                }
+                for r in readings
+            ],
+        )
+    _known_meter_ids.update(new_meter_ids)
+    if SQL_WINDOW_FUNCTIONS:
+        for r in readings:
+            since = _rollup_pending.get(r.meter_id)
+            if since is None or r.timestamp < since:
+                _rollup_pending[r.meter_id] = r.timestamp
+    # OR IGNORE drops duplicates silently; rowcount says how many were new
+    logger.debug(
+        "Persisted %d of %d readings (%d duplicates)",
+        result.rowcount,
+        len(readings),
+        len(readings) - result.rowcount,
     )
-    session.add(model)
+
+
+async def refresh_pending_rollup(session: AsyncSession) -> None:
+    """Catch the 1-minute intervals rollup up on meters written since the last
+    refresh.
+
+    Runs after the readings are committed, in transactions of its own, so a
+    failure never costs raw readings: it is logged and the same meters are
+    retried on the next call.
+    """
+    if not _rollup_pending:
+        return
+    since = dict(_rollup_pending)
+    _rollup_pending.clear()
     try:
-        await session.commit()
-    except IntegrityError:
-        # Duplicate reading, ignore
-        await session.rollback()
+        await catch_up_rollup(session, since)
+    except Exception:
+        logger.exception("Failed to refresh intervals rollup for %d meter(s)", len(since))
+        for meter_id, ts in since.items():
+            pending = _rollup_pending.get(meter_id)
+            if pending is None or ts < pending:
+                _rollup_pending[meter_id] = ts
+
+
+async def load_known_meter_ids(session: AsyncSession) -> None:
+    """Seed the known-meter cache from the meters table."""
+    async with session.begin():
+        result = await session.execute(select(Meter.meter_id))
+        _known_meter_ids.update(result.scalars().all())
+
+
+async def _batch_writer(
+    session: AsyncSession,
+    queue: asyncio.Queue[Optional[ParsedReading]],
+    rollup_wakeup: asyncio.Event,
+) -> None:
+    """Drain readings from the queue and persist them in batches until a None
+    sentinel, setting rollup_wakeup whenever a batch leaves rollup work."""
+    loop = asyncio.get_running_loop()
+    done = False
+    while not done:
+        reading = await queue.get()
+        if reading is None:
+            break
+        batch = [reading]
+        deadline = loop.time() + BATCH_TIMEOUT_S
+        while len(batch) < BATCH_SIZE:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                reading = await asyncio.wait_for(queue.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            if reading is None:
+                done = True
+                break
+            batch.append(reading)
+        try:
+            await persist_batch(session, batch)
+        except Exception:
+            # session.begin() has already rolled the batch back
+            logger.exception("Failed to persist batch of %d readings", len(batch))
+        if _rollup_pending:
+            rollup_wakeup.set()
+
+
+async def _rollup_refresher(writer: asyncio.Task[None], wakeup: asyncio.Event) -> None:
+    """Run refresh_pending_rollup beside the batch writer until it finishes.
+
+    It has a session of its own, so ingestion never waits on the rollup: a
+    long catch-up (a meter's first backfill) commits per meter and day while
+    batches keep committing in between. It runs at most once per wall-clock
+    minute, on the first batch of each, so that batch is rolled up at once
+    and reads see the rollup no more than a minute behind. Once the writer
+    is done it rolls up what the last batches wrote and returns.
+    """
+    last_minute: Optional[int] = None
+    async with get_session_factory()() as session:
+        while not writer.done():
+            await wakeup.wait()
+            wakeup.clear()
+            minute = int(time.time() // 60)
+            if minute == last_minute:
+                continue
+            last_minute = minute
+            await refresh_pending_rollup(session)
+        await refresh_pending_rollup(session)
+
+
+async def _wait_for_port(host: str, port: int, timeout: float) -> bool:
+    """Poll until host:port accepts a TCP connection; False if timeout elapses first."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    delay = PORT_POLL_INITIAL_S
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(delay, remaining))
+            delay *= 2
+            continue
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return True
 
 
 async def _run_rtlamr_stream(session: AsyncSession) -> None:
@@ -112,8 +316,14 @@ async def _run_rtlamr_stream(session: AsyncSession) -> None:
         stderr=asyncio.subprocess.STDOUT,
     )
 
-    # Give rtl_tcp time to initialize
-    await asyncio.sleep(7)
+    # Start rtlamr as soon as rtl_tcp is listening rather than after a fixed delay
+    if not await _wait_for_port(host, port, timeout=PORT_WAIT_TIMEOUT_S):
+        logger.warning(
+            "rtl_tcp not accepting connections on %s:%s after %.0fs; starting rtlamr anyway",
+            host,
+            port,
+            PORT_WAIT_TIMEOUT_S,
+        )
 
     unique = os.getenv("POWER_MONITOR_UNIQUE", "true").lower()
     unique_arg = ["-unique=true"] if unique in {"1", "true", "yes"} else []
@@ -130,6 +340,14 @@ async def _run_rtlamr_stream(session: AsyncSession) -> None:
 
     loop = asyncio.get_running_loop()
     stop_event = asyncio.Event()
+    queue: asyncio.Queue[Optional[ParsedReading]] = asyncio.Queue(maxsize=BATCH_SIZE * 10)
+    rollup_wakeup = asyncio.Event()
+    writer = asyncio.create_task(_batch_writer(session, queue, rollup_wakeup))
+    refresher = (
+        asyncio.create_task(_rollup_refresher(writer, rollup_wakeup))
+        if SQL_WINDOW_FUNCTIONS
+        else None
+    )
 
     def _handle_signal(*_: object) -> None:
         stop_event.set()
@@ -141,25 +359,38 @@ async def _run_rtlamr_stream(session: AsyncSession) -> None:
             # Signals may not be available on some platforms
             pass
 
+    restart_delay = RESTART_BACKOFF_INITIAL_S
     try:
         while not stop_event.is_set():
             args = _build_args()
+            started_at = loop.time()
             logger.info("Starting rtlamr with args: %s", " ".join(args))
             rtlamr_proc = await asyncio.create_subprocess_exec(
                 *args,
                 stdout=asyncio.subprocess.PIPE,
             )
             assert rtlamr_proc.stdout is not None
+            # Incomplete trailing line carried over to the next chunk
+            pending = b""
             try:
                 while not stop_event.is_set():
-                    line_bytes = await rtlamr_proc.stdout.readline()
-                    if not line_bytes:
+                    # read() returns whatever is buffered (up to the limit), so a
+                    # burst of readings costs one wakeup instead of one per line
+                    chunk = await rtlamr_proc.stdout.read(READ_CHUNK_SIZE)
+                    if not chunk:
+                        lines = [pending] if pending else []
+                    else:
+                        *lines, pending = (pending + chunk).split(b"\n")
+                    for line_bytes in lines:
+                        if b".go:" in line_bytes:
+                            continue  # rtlamr log line; skip before decoding
+                        line = line_bytes.decode("utf-8", errors="ignore")
+                        reading = parse_rtlamr_csv_line(line)
+                        if reading is None:
+                            continue
+                        await queue.put(reading)
+                    if not chunk:
                         break
-                    line = line_bytes.decode("utf-8", errors="ignore")
-                    reading = parse_rtlamr_csv_line(line)
-                    if reading is None:
-                        continue
-                    await persist_reading(session, reading)
             except asyncio.CancelledError:
                 raise
             finally:
@@ -169,13 +400,27 @@ async def _run_rtlamr_stream(session: AsyncSession) -> None:
 
             if stop_event.is_set():
                 break
+            if loop.time() - started_at >= RESTART_HEALTHY_RUN_S:
+                restart_delay = RESTART_BACKOFF_INITIAL_S
             logger.warning(
-                "rtlamr exited (returncode=%s), restarting in 5s...",
+                "rtlamr exited (returncode=%s), restarting in %.2fs...",
                 rtlamr_proc.returncode,
+                restart_delay,
             )
-            await asyncio.sleep(5)
+            try:
+                # Wake early if asked to stop during the backoff
+                await asyncio.wait_for(stop_event.wait(), timeout=restart_delay)
+            except asyncio.TimeoutError:
+                pass
+            restart_delay = min(restart_delay * 2, RESTART_BACKOFF_MAX_S)
     finally:
         logger.info("Shutting down collector processes")
+        # Flush whatever is still queued before exiting
+        await queue.put(None)
+        await writer
+        if refresher is not None:
+            rollup_wakeup.set()
+            await refresher
         if rtl_tcp_proc.returncode is None:
             rtl_tcp_proc.terminate()
         await rtl_tcp_proc.wait()
@@ -187,12 +432,19 @@ async def replay_from_csv(csv_path: str) -> None:
     session_factory = get_session_factory()
 
     async with session_factory() as session:
+        await load_known_meter_ids(session)
+        batch: list[ParsedReading] = []
         with open(csv_path, "r", encoding="utf-8") as f:
             for line in f:
                 reading = parse_rtlamr_csv_line(line)
                 if reading is None:
                     continue
-                await persist_reading(session, reading)
+                batch.append(reading)
+                if len(batch) >= BATCH_SIZE:
+                    await persist_batch(session, batch)
+                    batch = []
+        await persist_batch(session, batch)
+        await refresh_pending_rollup(session)
 
 
 async def run_collector() -> None:
@@ -206,6 +458,7 @@ async def run_collector() -> None:
     get_engine()
     session_factory = get_session_factory()
     async with session_factory() as session:
+        await load_known_meter_ids(session)
         await _run_rtlamr_stream(session)
 
 
@@ -1,5 +1,9 @@
+from datetime import datetime, tzinfo
+from functools import lru_cache
 from pathlib import Path
-from pydantic import BaseModel
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from pydantic import BaseModel, Field, field_validator
 from dotenv import load_dotenv
 import os
 
@@ -22,8 +26,46 @@ class Settings(BaseModel):
     rtlamr_path: str = os.getenv("POWER_MONITOR_RTLAMR_PATH", "rtlamr")
     rtl_tcp_path: str = os.getenv("POWER_MONITOR_RTL_TCP_PATH", "rtl_tcp")
     gauge_window_seconds: int = int(os.getenv("POWER_MONITOR_GAUGE_WINDOW_SECONDS", "86400"))
+    # IANA zone of the naive local timestamps the collector stores, e.g.
+    # "America/New_York"; unset means the server's local time
+    timezone: Optional[str] = Field(
+        default=os.getenv("POWER_MONITOR_TZ") or None, validate_default=True
+    )
 
+    @field_validator("timezone")
+    @classmethod
+    def _known_timezone(cls, name: Optional[str]) -> Optional[str]:
+        """Reject unknown zones here, at startup, rather than on every request."""
+        if name:
+            try:
+                _zone(name)
+            except (ZoneInfoNotFoundError, ValueError, OSError) as e:
+                raise ValueError(
+                    f"POWER_MONITOR_TZ={name!r} is not a known IANA timezone "
+                    '(e.g. "America/New_York")'
+                ) from e
+        return name
 
+
+@lru_cache(maxsize=1)
 def get_settings() -> Settings:
+    """Process-wide settings; call get_settings.cache_clear() to rebuild."""
     return Settings()
 
+
+@lru_cache(maxsize=8)
+def _zone(name: str) -> ZoneInfo:
+    return ZoneInfo(name)
+
+
+def get_local_tz() -> tzinfo:
+    """Zone for naive stored timestamps and "now" in queries.
+
+    POWER_MONITOR_TZ if set; otherwise the server's current local offset,
+    looked up on every call so it follows DST changes.
+    """
+    name = get_settings().timezone
+    if name:
+        return _zone(name)
+    return datetime.now().astimezone().tzinfo
+
@@ -7,6 +7,9 @@ from pathlib import Path
 
 from .config import get_settings
 
+# Last parsed filter_ids.txt, keyed by (path, st_mtime_ns, st_size)
+_filter_ids_cache: tuple[tuple[Path, int, int], list[str]] | None = None
+
 
 def get_filter_ids_path() -> Path:
     """Path to filter_ids.txt (next to database, writable by app)."""
@@ -19,15 +22,24 @@ def read_filter_ids() -> list[str]:
     Get filter IDs: from filter_ids.txt if it exists, else from POWER_MONITOR_FILTER_IDS env.
     Returns list of meter IDs (empty = discovery mode).
     """
+    global _filter_ids_cache
     path = get_filter_ids_path()
-    if path.exists():
+    try:
+        st = path.stat()
+    except OSError:
+        st = None
+    if st is not None:
+        key = (path, st.st_mtime_ns, st.st_size)
+        if _filter_ids_cache is not None and _filter_ids_cache[0] == key:
+            return list(_filter_ids_cache[1])
         try:
             raw = path.read_text().strip()
-            if raw:
-                return [m.strip() for m in raw.split(",") if m.strip()]
-            return []
         except OSError:
             pass
+        else:
+            ids = [m.strip() for m in raw.split(",") if m.strip()] if raw else []
+            _filter_ids_cache = (key, ids)
+            return list(ids)
     env_val = (os.getenv("POWER_MONITOR_FILTER_IDS") or "").strip()
     if env_val:
         return [m.strip() for m in env_val.split(",") if m.strip()]
@@ -36,6 +48,8 @@ def read_filter_ids() -> list[str]:
 
 def write_filter_ids(meter_ids: list[str]) -> None:
     """Write meter IDs to filter_ids.txt. Empty list = discovery mode."""
+    global _filter_ids_cache
+    _filter_ids_cache = None
     path = get_filter_ids_path()
     content = ",".join(meter_ids) if meter_ids else ""
     path.write_text(content)
@@ -4,7 +4,10 @@ import asyncio
 import csv
 import json
 import logging
+import re
 import uuid
+from itertools import groupby
+from operator import attrgetter
 from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
@@ -12,12 +15,12 @@ from typing import Any, AsyncIterator, List, Optional
 
 from fastapi import Depends, FastAPI, File, UploadFile, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, Response, StreamingResponse
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy import func, select
+from sqlalchemy import Row, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from .config import get_settings
+from .config import get_local_tz, get_settings
 from .database import get_session, init_db
 
 # In-memory import job status (job_id -> { status, result?, error? })
@@ -25,13 +28,33 @@ _import_jobs: dict[str, dict[str, Any]] = {}
 from .filter_config import get_filter_ids_path, read_filter_ids, write_filter_ids
 from .models import Meter, MeterSettings, RawReading
 from .schemas import FilterIdsUpdate, MeterOut, MeterUpdate, UsageSeries, UsagePoint
-from .usage import compute_intervals, bucket_intervals, get_recent_power_for_meter
+from .usage import (
+    STREAM_CHUNK_ROWS,
+    KwAccumulator,
+    RESOLUTION_MINUTES,
+    SQL_WINDOW_FUNCTIONS,
+    bucket_interval_arrays,
+    bucket_intervals,
+    bucket_usage_sql,
+    catch_up_rollup,
+    compute_interval_arrays,
+    compute_intervals,
+    get_recent_power_for_meters,
+    invalidate_recent_power,
+    stale_rollup_meters,
+)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncIterator[None]:
     await init_db()
+    # Backfill the intervals rollup (history, or what an import invalidated)
+    # without holding up startup
+    if SQL_WINDOW_FUNCTIONS:
+        _start_rollup_refresh()
     yield
+    if _rollup_refresh is not None:
+        _rollup_refresh.cancel()
 
 
 app = FastAPI(title="Power Monitor", lifespan=lifespan)
@@ -50,6 +73,11 @@ async def get_db() -> AsyncIterator[AsyncSession]:
         yield session
 
 
+def _local_naive(dt: datetime) -> datetime:
+    """Convert an aware datetime to naive local time, as stored by SQLite; naive passes through."""
+    return dt.astimezone(get_local_tz()).replace(tzinfo=None) if dt.tzinfo else dt
+
+
 # Serve built frontend from frontend/dist (same origin as API for /api calls)
 _FRONTEND_DIST = Path(__file__).resolve().parent.parent.parent / "frontend" / "dist"
 
@@ -68,23 +96,19 @@ else:
 
 @app.get("/api/meters", response_model=List[MeterOut])
 async def list_meters(db: AsyncSession = Depends(get_db)) -> List[MeterOut]:
-    subq_last = (
-        select(
-            RawReading.meter_id,
-            func.max(RawReading.timestamp).label("last_ts"),
-        )
-        .group_by(RawReading.meter_id)
-        .subquery()
+    # Correlated per-meter max: one (meter_id, timestamp) index descent per meter
+    # instead of aggregating the whole table with GROUP BY
+    last_ts = (
+        select(func.max(RawReading.timestamp))
+        .where(RawReading.meter_id == Meter.meter_id)
+        .correlate(Meter)
+        .scalar_subquery()
+        .label("last_ts")
     )
 
     q = (
-        select(Meter, MeterSettings, subq_last.c.last_ts)
+        select(Meter, MeterSettings, last_ts)
         .select_from(Meter)
-        .join(
-            subq_last,
-            subq_last.c.meter_id == Meter.meter_id,
-            isouter=True,
-        )
         .join(MeterSettings, MeterSettings.meter_id == Meter.meter_id, isouter=True)
     )
 
@@ -93,15 +117,17 @@ async def list_meters(db: AsyncSession = Depends(get_db)) -> List[MeterOut]:
     meters: List[MeterOut] = []
     settings_obj = get_settings()
     window = timedelta(seconds=settings_obj.gauge_window_seconds)
+    current_kw_by_meter = await get_recent_power_for_meters(
+        db, [meter.meter_id for meter, _, _ in rows], window
+    )
     for meter, settings, last_ts in rows:
-        current_kw = await get_recent_power_for_meter(db, meter.meter_id, window)
         meters.append(
             MeterOut(
                 meter_id=meter.meter_id,
                 label=meter.label,
                 active=meter.active,
                 last_seen=last_ts,
-                current_estimated_kw=current_kw,
+                current_estimated_kw=current_kw_by_meter.get(meter.meter_id),
                 settings=settings,
             )
         )
@@ -166,42 +192,135 @@ async def get_usage(
         meter_ids = [m.strip() for m in meters.split(",") if m.strip()]
 
     # Use local time for query - DB stores local timestamps (matches gauge)
-    now_local = datetime.now().astimezone()
-    end = now_local.replace(tzinfo=None)  # Always use server "now" so chart shows latest data
-    if start is None:
-        start = (now_local - timedelta(days=90)).replace(tzinfo=None)
-    else:
-        start = start.astimezone().replace(tzinfo=None) if start.tzinfo else start
+    now_local = datetime.now(get_local_tz()).replace(tzinfo=None)
+    end = now_local  # Always use server "now" so chart shows latest data
+    start = now_local - timedelta(days=90) if start is None else _local_naive(start)
+
+    if SQL_WINDOW_FUNCTIONS and resolution in RESOLUTION_MINUTES:
+        # Sum the 1-minute rollup inside SQLite; only bucket rows come back.
+        # The collector refreshes it once a minute, so one minute behind is
+        # normal. Meters further behind (first start after an upgrade, a CLI
+        # import) are read from raw readings until the rollup catches up.
+        try:
+            stale = await stale_rollup_meters(db, meter_ids, lag_minutes=1)
+            by_meter = await bucket_usage_sql(db, meter_ids, start, end, resolution)
+        except Exception as e:
+            logging.exception("Usage query failed: %s", e)
+            raise
+        series = {
+            meter_id: UsageSeries(
+                meter_id=meter_id,
+                points=[UsagePoint(timestamp=ts, kwh=kwh, kw=kw) for ts, kwh, kw in buckets],
+            )
+            for meter_id, buckets in by_meter.items()
+        }
+        if stale:
+            _start_rollup_refresh()
+            # Same meters, same order: a stale meter with readings in range
+            # already has its (incomplete) series here
+            for recomputed in await _usage_from_readings(db, stale, start, end, resolution):
+                series[recomputed.meter_id] = recomputed
+        return list(series.values())
+
+    return await _usage_from_readings(db, meter_ids, start, end, resolution)
+
 
-    q = select(RawReading).order_by(RawReading.meter_id, RawReading.timestamp)
+async def _usage_from_readings(
+    db: AsyncSession,
+    meter_ids: Optional[List[str]],
+    start: datetime,
+    end: datetime,
+    resolution: str,
+) -> List[UsageSeries]:
+    """Usage series computed in Python from raw readings, in meter_id order."""
+    # Plain column rows: compute_intervals only reads timestamp/cumulative_kwh,
+    # so there is no need to build ORM instances
+    q = select(
+        RawReading.meter_id, RawReading.timestamp, RawReading.cumulative_kwh
+    ).order_by(RawReading.meter_id, RawReading.timestamp)
     if meter_ids:
         q = q.where(RawReading.meter_id.in_(meter_ids))
     q = q.where(RawReading.timestamp >= start, RawReading.timestamp <= end)
 
+    # Stream the ordered rows and hand each meter's run to a worker thread as
+    # soon as the meter_id changes, so interval math for earlier meters overlaps
+    # with fetching later ones. Interval math is CPU-bound; running it off the
+    # event loop keeps other requests (gauges, meter list) from stalling.
+    tasks: List[asyncio.Future[UsageSeries]] = []
+    current_meter: Optional[str] = None
+    buf: List[Row] = []
+
+    def _dispatch() -> None:
+        tasks.append(asyncio.ensure_future(
+            asyncio.to_thread(_process_meter, current_meter, buf, resolution)
+        ))
+
     try:
-        rows = (await db.execute(q)).scalars().all()
+        result = await db.stream(q.execution_options(yield_per=1000))
+        async for partition in result.partitions():
+            for r in partition:
+                if r.meter_id != current_meter:
+                    if buf:
+                        _dispatch()
+                    current_meter, buf = r.meter_id, []
+                buf.append(r)
     except Exception as e:
         logging.exception("Usage query failed: %s", e)
+        for task in tasks:
+            task.cancel()
         raise
+    if buf:
+        _dispatch()
 
-    by_meter: dict[str, List[RawReading]] = {}
-    for r in rows:
-        by_meter.setdefault(r.meter_id, []).append(r)
+    return list(await asyncio.gather(*tasks))
 
-    series_list: List[UsageSeries] = []
-    for meter_id, readings in by_meter.items():
-        try:
-            intervals = compute_intervals(readings)
-            bucketed = bucket_intervals(intervals, resolution)
-            points: List[UsagePoint] = [
-                UsagePoint(timestamp=ts, kwh=kwh, kw=kw) for ts, kwh, kw in bucketed
-            ]
-            series_list.append(UsageSeries(meter_id=meter_id, points=points))
-        except Exception as e:
-            logging.exception("Usage processing failed for meter %s: %s", meter_id, e)
-            raise
 
-    return series_list
+# Background _refresh_stale_rollup run, if one has been started
+_rollup_refresh: Optional[asyncio.Task[None]] = None
+
+
+def _start_rollup_refresh() -> None:
+    """Run _refresh_stale_rollup in the background unless it already is."""
+    global _rollup_refresh
+    if _rollup_refresh is None or _rollup_refresh.done():
+        _rollup_refresh = asyncio.create_task(_refresh_stale_rollup())
+
+
+async def _refresh_stale_rollup() -> None:
+    """Rebuild the rollup for meters with readings past their newest rollup row.
+
+    Runs in the background at startup, and again when usage reads find a
+    stale meter. Failures are logged, not raised: reads keep falling back to
+    raw readings for those meters.
+    """
+    try:
+        async with get_session() as db:
+            stale = await stale_rollup_meters(db)
+        if not stale:
+            return
+        async with get_session() as db:
+            await catch_up_rollup(db, dict.fromkeys(stale))
+        logging.info("Refreshed intervals rollup for %d meter(s)", len(stale))
+    except Exception as e:
+        logging.exception("Rollup refresh failed: %s", e)
+
+
+def _process_meter(meter_id: str, readings: List[Row], resolution: str) -> UsageSeries:
+    """Turn one meter's ordered readings into a bucketed usage series."""
+    try:
+        if resolution in RESOLUTION_MINUTES:
+            # Columnar path: no per-interval objects until the bucket rows
+            end_us, utc_offset_s, delta_kwh, _ = compute_interval_arrays(readings)
+            bucketed = bucket_interval_arrays(end_us, utc_offset_s, delta_kwh, resolution)
+        else:
+            bucketed = bucket_intervals(compute_intervals(readings), resolution)
+        points: List[UsagePoint] = [
+            UsagePoint(timestamp=ts, kwh=kwh, kw=kw) for ts, kwh, kw in bucketed
+        ]
+        return UsageSeries(meter_id=meter_id, points=points)
+    except Exception as e:
+        logging.exception("Usage processing failed for meter %s: %s", meter_id, e)
+        raise
 
 
 @app.get("/api/gauge/debug")
@@ -212,25 +331,30 @@ async def gauge_debug(
 ) -> dict:
     """Debug why gauge shows --: readings in window, intervals, computed kW."""
     try:
-        from .usage import get_recent_power_for_meter, compute_intervals
+        from .usage import get_recent_power_for_meter
 
         window = timedelta(minutes=window_minutes)
-        now = datetime.now().astimezone()
-        start_time = (now - window).replace(tzinfo=None)
+        now = datetime.now(get_local_tz())
+        start_time = _local_naive(now - window)
 
         q = (
-            select(RawReading)
+            select(RawReading.timestamp, RawReading.cumulative_kwh)
             .where(
                 RawReading.meter_id == meter_id,
                 RawReading.timestamp >= start_time,
             )
             .order_by(RawReading.timestamp)
         )
-        rows = (await db.execute(q)).scalars().all()
-        intervals = compute_intervals(rows) if len(rows) >= 2 else []
+        # Stream the window; only counts and the first few timestamps are kept
+        acc = KwAccumulator()
+        sample_ts: list[str] = []
+        result = await db.stream(q.execution_options(yield_per=STREAM_CHUNK_ROWS))
+        async for rows in result.partitions():
+            if len(sample_ts) < 5:
+                sample_ts.extend(str(r.timestamp) for r in rows[: 5 - len(sample_ts)])
+            acc.feed(rows)
         current_kw = await get_recent_power_for_meter(db, meter_id, window)
 
-        sample_ts = [str(r.timestamp) for r in rows[:5]] if rows else []
         q_recent = (
             select(RawReading.timestamp)
             .where(RawReading.meter_id == meter_id)
@@ -246,8 +370,8 @@ async def gauge_debug(
             "window_minutes": window_minutes,
             "now_local": now.isoformat(),
             "start_time_local": str(start_time),
-            "readings_in_window": len(rows),
-            "intervals_produced": len(intervals),
+            "readings_in_window": acc.n_readings,
+            "intervals_produced": acc.n_kept,
             "current_kw": current_kw,
             "sample_timestamps": sample_ts,
             "recent_in_db_any": recent_ts,
@@ -265,28 +389,19 @@ async def usage_debug(db: AsyncSession = Depends(get_db)) -> dict:
     try:
         now = datetime.now(timezone.utc)
         start = now - timedelta(days=1)
+        # One ordered stream over all meters gives both counts per meter
         q = (
-            select(RawReading.meter_id, func.count(RawReading.id).label("cnt"))
+            select(RawReading.meter_id, RawReading.timestamp, RawReading.cumulative_kwh)
             .where(RawReading.timestamp >= start)
-            .group_by(RawReading.meter_id)
+            .order_by(RawReading.meter_id, RawReading.timestamp)
         )
-        rows = (await db.execute(q)).all()
-        readings_per_meter = {r.meter_id: r.cnt for r in rows}
-
-        # Compute intervals for each meter
-        intervals_per_meter: dict[str, int] = {}
-        for meter_id in readings_per_meter:
-            q2 = (
-                select(RawReading)
-                .where(
-                    RawReading.meter_id == meter_id,
-                    RawReading.timestamp >= start,
-                )
-                .order_by(RawReading.timestamp)
-            )
-            rrows = (await db.execute(q2)).scalars().all()
-            intervals = compute_intervals(rrows)
-            intervals_per_meter[meter_id] = len(intervals)
+        accs: dict[str, KwAccumulator] = {}
+        result = await db.stream(q.execution_options(yield_per=STREAM_CHUNK_ROWS))
+        async for rows in result.partitions():
+            for meter_id, run in groupby(rows, key=attrgetter("meter_id")):
+                accs.setdefault(meter_id, KwAccumulator()).feed(list(run))
+        readings_per_meter = {mid: acc.n_readings for mid, acc in accs.items()}
+        intervals_per_meter = {mid: acc.n_kept for mid, acc in accs.items()}
 
         return {
             "readings_per_meter_24h": readings_per_meter,
@@ -337,25 +452,30 @@ async def usage_anomalies(
             start_dt = datetime.fromisoformat(date + "T00:00:00+00:00")
             end_dt = start_dt + timedelta(days=1)
             q = (
-                select(RawReading)
+                select(RawReading.meter_id, RawReading.timestamp, RawReading.cumulative_kwh)
                 .where(RawReading.timestamp >= start_dt, RawReading.timestamp < end_dt)
                 .order_by(RawReading.meter_id, RawReading.timestamp)
             )
-            rows = (await db.execute(q)).scalars().all()
-            by_meter: dict[str, list] = {}
-            for r in rows:
-                by_meter.setdefault(r.meter_id, []).append(r)
             large: list = []
-            for mid, readings in by_meter.items():
-                intervals = compute_intervals(readings)
-                for p in intervals:
-                    if p.delta_kwh > 50:  # > 50 kWh in one interval is suspicious
-                        large.append({
-                            "meter_id": mid,
-                            "timestamp": p.timestamp.isoformat(),
-                            "delta_kwh": round(p.delta_kwh, 2),
-                            "kw": round(p.kw, 2),
-                        })
+            # Streamed per meter; each chunk starts from the meter's previous
+            # reading so intervals spanning chunk boundaries are kept
+            last_row: dict[str, Row] = {}
+            stream = await db.stream(q.execution_options(yield_per=STREAM_CHUNK_ROWS))
+            async for rows in stream.partitions():
+                for mid, run in groupby(rows, key=attrgetter("meter_id")):
+                    readings = list(run)
+                    prev = last_row.get(mid)
+                    last_row[mid] = readings[-1]
+                    if prev is not None:
+                        readings.insert(0, prev)
+                    for p in compute_intervals(readings):
+                        if p.delta_kwh > 50:  # > 50 kWh in one interval is suspicious
+                            large.append({
+                                "meter_id": mid,
+                                "timestamp": p.timestamp.isoformat(),
+                                "delta_kwh": round(p.delta_kwh, 2),
+                                "kw": round(p.kw, 2),
+                            })
             result["large_intervals"] = sorted(large, key=lambda x: -x["delta_kwh"])[:20]
         return result
     except Exception as e:
@@ -369,51 +489,55 @@ async def export_usage_csv(
     meters: Optional[str] = None,
     start: Optional[datetime] = None,
     end: Optional[datetime] = None,
-    db: AsyncSession = Depends(get_db),
 ):
     """Export raw readings as CSV. Query params: meters=id1,id2 (required), start=ISO, end=ISO (optional)."""
     meter_ids = [m.strip() for m in (meters or "").split(",") if m.strip()] if meters else None
     if not meter_ids:
         from fastapi import HTTPException
         raise HTTPException(status_code=400, detail="Specify meters=id1,id2")
-    now_local = datetime.now().astimezone()
-    end_dt = now_local.replace(tzinfo=None) if end is None else (end.astimezone().replace(tzinfo=None) if end.tzinfo else end)
-    start_dt = (now_local - timedelta(days=90)).replace(tzinfo=None) if start is None else (start.astimezone().replace(tzinfo=None) if start.tzinfo else start)
+    now_local = datetime.now(get_local_tz()).replace(tzinfo=None)
+    end_dt = now_local if end is None else _local_naive(end)
+    start_dt = now_local - timedelta(days=90) if start is None else _local_naive(start)
     q = (
-        select(RawReading)
+        select(RawReading.meter_id, RawReading.timestamp, RawReading.cumulative_raw)
         .where(RawReading.meter_id.in_(meter_ids))
         .where(RawReading.timestamp >= start_dt, RawReading.timestamp <= end_dt)
         .order_by(RawReading.meter_id, RawReading.timestamp)
     )
-    rows = (await db.execute(q)).scalars().all()
-    lines = ["meter_id,timestamp,cumulative_raw"]
-    for r in rows:
-        ts = r.timestamp.isoformat() if (r.timestamp and getattr(r.timestamp, "tzinfo", None)) else str(r.timestamp)
-        lines.append(f"{r.meter_id},{ts},{r.cumulative_raw}")
-    body = "\n".join(lines).encode("utf-8")
-    return Response(
-        content=body,
+
+    async def _csv_chunks() -> AsyncIterator[bytes]:
+        # Request-scoped sessions are closed before a streaming body is sent,
+        # so the stream uses its own session
+        async with get_session() as db:
+            yield b"meter_id,timestamp,cumulative_raw"
+            result = await db.stream(q.execution_options(yield_per=1000))
+            async for rows in result.partitions():
+                lines = []
+                for meter_id, timestamp, cumulative_raw in rows:
+                    # Rows may mix naive (collector) and offset-carrying (import)
+                    # timestamps, so the format is chosen per row
+                    ts = timestamp.isoformat() if timestamp.tzinfo else str(timestamp)
+                    lines.append(f"\n{meter_id},{ts},{cumulative_raw}")
+                yield "".join(lines).encode("utf-8")
+
+    return StreamingResponse(
+        _csv_chunks(),
         media_type="text/csv",
         headers={"Content-Disposition": "attachment; filename=power_usage_export.csv"},
     )
 
 
+# Splits an ISO timestamp at its fraction: base, fraction digits, offset
+_TS_FRACTION_RE = re.compile(r"^([^.]*)\.(\d*)(.*)$")
+
+
 def _parse_timestamp(ts_raw: str) -> datetime | None:
     """Parse ISO timestamp; truncate to 6 fractional digits for fromisoformat (e.g. rtlamr output)."""
     try:
         ts_raw = ts_raw.strip().replace("Z", "+00:00")
-        if "." in ts_raw:
-            base, rest = ts_raw.split(".", 1)
-            digits = ""
-            tz_part = ""
-            for c in rest:
-                if c.isdigit():
-                    digits += c
-                else:
-                    tz_part = rest[len(digits) :]
-                    break
-            frac = (digits[:6] + "000000")[:6]
-            ts_raw = f"{base}.{frac}{tz_part}"
+        m = _TS_FRACTION_RE.match(ts_raw)
+        if m is not None:
+            ts_raw = f"{m[1]}.{(m[2] + '000000')[:6]}{m[3]}"
         ts = datetime.fromisoformat(ts_raw)
         return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
     except (ValueError, TypeError, AttributeError):
@@ -458,12 +582,16 @@ async def _do_import_content(content: bytes) -> dict[str, Any]:
     reader = csv.reader(text.splitlines())
     rows: list[tuple[str, datetime, int]] = []
     meter_ids: set[str] = set()
+    # Earliest imported timestamp per meter; the rollup is rebuilt from there
+    first_ts: dict[str, datetime] = {}
     for row in reader:
         parsed = _parse_import_row(row)
         if parsed is not None:
             meter_id, ts, cum = parsed
             rows.append((meter_id, ts, cum))
             meter_ids.add(meter_id)
+            if meter_id not in first_ts or ts < first_ts[meter_id]:
+                first_ts[meter_id] = ts
     if not rows or not meter_ids:
         return {"inserted": 0, "skipped": 0, "duplicates_ignored": 0, "meters_seen": 0}
 
@@ -516,6 +644,8 @@ async def _do_import_content(content: bytes) -> dict[str, Any]:
                     except IntegrityError:
                         await db.rollback()
                         skipped += 1
+        if inserted and SQL_WINDOW_FUNCTIONS:
+            await catch_up_rollup(db, first_ts)
     return {
         "inserted": inserted,
         "skipped": skipped,
@@ -535,6 +665,8 @@ async def _run_import_job(job_id: str, temp_path: Path) -> None:
         if "error" in result:
             _import_jobs[job_id] = {"status": "failed", "error": result["error"]}
         else:
+            # Imported rows may fall inside the gauge window
+            invalidate_recent_power()
             _import_jobs[job_id] = {"status": "completed", "result": result}
     except Exception as e:
         logging.exception("Import job %s failed: %s", job_id, e)
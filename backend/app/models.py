@@ -9,7 +9,6 @@ from sqlalchemy import (
     ForeignKey,
     Integer,
     String,
-    UniqueConstraint,
     Index,
     text,
 )
@@ -36,17 +35,22 @@ class Meter(Base):
 
 class RawReading(Base):
     __tablename__ = "raw_readings"
-    __table_args__ = (
-        UniqueConstraint("meter_id", "timestamp", "cumulative_raw", name="uq_reading"),
-        Index("ix_raw_readings_meter_ts", "meter_id", "timestamp"),
-    )
+    # Clustered on (meter_id, timestamp, cumulative_raw): one b-tree serves both
+    # duplicate detection and per-meter time-range scans, with no rowid tree.
+    # Databases created before this keep their rowid table (id column,
+    # uq_reading, ix_raw_readings_meter_ts) until converted with
+    # "import_csv.py --rebuild"; nothing here depends on id. The clustered key
+    # already covers every column, so the covering index for those legacy
+    # tables is created in init_db rather than declared here.
+    __table_args__ = ({"sqlite_with_rowid": False},)
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     meter_id: Mapped[str] = mapped_column(
-        String, ForeignKey("meters.meter_id"), index=True
+        String, ForeignKey("meters.meter_id"), primary_key=True
     )
-    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
-    cumulative_raw: Mapped[int] = mapped_column(Integer)
+    timestamp: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), primary_key=True, index=True
+    )
+    cumulative_raw: Mapped[int] = mapped_column(Integer, primary_key=True)
     cumulative_kwh: Mapped[float] = mapped_column(Float)
     source: Mapped[str] = mapped_column(String, default="rtlamr")
 
@@ -69,15 +73,17 @@ class Interval(Base):
     __tablename__ = "intervals"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    meter_id: Mapped[str] = mapped_column(
-        String, ForeignKey("meters.meter_id"), index=True
-    )
-    start_ts: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
-    end_ts: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
+    meter_id: Mapped[str] = mapped_column(String, ForeignKey("meters.meter_id"))
+    start_ts: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    end_ts: Mapped[datetime] = mapped_column(DateTime(timezone=True))
     delta_kwh: Mapped[float] = mapped_column(Float)
     avg_kw: Mapped[float] = mapped_column(Float)
 
+    # 1-minute usage rollup, maintained by usage.refresh_rollup. Covering, so
+    # bucketed usage reads are index-only scans; it also serves every meter_id
+    # and (meter_id, start_ts) lookup, so the columns carry no indexes of
+    # their own.
     __table_args__ = (
-        Index("ix_intervals_meter_start", "meter_id", "start_ts"),
+        Index("ix_intervals_cover", "meter_id", "start_ts", "delta_kwh"),
     )
 
@@ -1,18 +1,41 @@
 from __future__ import annotations
 
+import sqlite3
+import time
 from collections import defaultdict
 from dataclasses import dataclass
-from datetime import datetime, timedelta, timezone
-from typing import Dict, Iterable, List, Tuple
+from datetime import date, datetime, timedelta, timezone, tzinfo
+from itertools import groupby
+from operator import attrgetter
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from sqlalchemy import select
+import numpy as np
+from sqlalchemy import (
+    Float,
+    Integer,
+    Row,
+    String,
+    and_,
+    case,
+    cast,
+    delete,
+    func,
+    insert,
+    or_,
+    select,
+    type_coerce,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from .models import RawReading
+from .config import get_local_tz
+from .models import Interval, RawReading
 
 
 @dataclass
 class IntervalPoint:
+    # Declared by hand: dataclass(slots=True) needs Python 3.10
+    __slots__ = ("timestamp", "delta_kwh", "kw")
+
     timestamp: datetime
     delta_kwh: float
     kw: float
@@ -23,43 +46,182 @@ async def get_recent_power_for_meter(
 ) -> float | None:
     """Compute average kW for the given meter over a trailing time window."""
     # Use local time - SQLite/rtlamr typically store local timestamps
-    now = datetime.now().astimezone()
-    start_time = (now - window).replace(tzinfo=None)  # naive for SQLite comparison
+    start_time = _local_wall(datetime.now(timezone.utc) - window)  # naive for SQLite comparison
+
+    if SQL_WINDOW_FUNCTIONS:
+        # Only the aggregate leaves SQLite, not every reading in the window
+        by_meter = await _recent_power_sql(
+            db, RawReading.meter_id == meter_id, RawReading.timestamp >= start_time
+        )
+        return by_meter.get(meter_id)
 
     q = (
-        select(RawReading)
+        select(RawReading.timestamp, RawReading.cumulative_kwh)
         .where(
             RawReading.meter_id == meter_id,
             RawReading.timestamp >= start_time,
         )
         .order_by(RawReading.timestamp)
     )
-    rows: List[RawReading] = (await db.execute(q)).scalars().all()
-    if len(rows) < 2:
-        return None
+    acc = KwAccumulator()
+    result = await db.stream(q.execution_options(yield_per=STREAM_CHUNK_ROWS))
+    async for rows in result.partitions():
+        acc.feed(rows)
+    return acc.average_kw()
 
-    points = compute_intervals(rows)
-    if not points:
-        return None
 
-    total_kwh = sum(p.delta_kwh for p in points)
-    total_hours = sum(
-        (points[i].timestamp - points[i - 1].timestamp).total_seconds() / 3600.0
-        for i in range(1, len(points))
+# (meter_id, window seconds) -> (monotonic expiry, kW). A trailing average over
+# a window of minutes to hours barely moves between polls of the meter list.
+# The collector writes from another process, so entries can't be invalidated
+# on ingest; the TTL bounds how stale a gauge can get instead.
+_kw_cache: Dict[Tuple[str, float], Tuple[float, float | None]] = {}
+KW_CACHE_MIN_TTL_S = 5.0
+KW_CACHE_MAX_TTL_S = 60.0
+
+
+def _kw_cache_ttl(window: timedelta) -> float:
+    return min(max(window.total_seconds() / 20, KW_CACHE_MIN_TTL_S), KW_CACHE_MAX_TTL_S)
+
+
+def invalidate_recent_power(meter_ids: Iterable[str] | None = None) -> None:
+    """Drop cached gauge values (all meters, or just meter_ids) after a write."""
+    if meter_ids is None:
+        _kw_cache.clear()
+        return
+    drop = set(meter_ids)
+    for key in [k for k in _kw_cache if k[0] in drop]:
+        del _kw_cache[key]
+
+
+async def get_recent_power_for_meters(
+    db: AsyncSession, meter_ids: Iterable[str], window: timedelta
+) -> Dict[str, float | None]:
+    """Average kW per meter over a trailing window, using one query for all meters.
+
+    Results are cached per meter for a few seconds (see _kw_cache_ttl); only
+    meters without a fresh entry are queried.
+    """
+    meter_ids = list(meter_ids)
+    if not meter_ids:
+        return {}
+    window_s = window.total_seconds()
+    now_mono = time.monotonic()
+    cached: Dict[str, float | None] = {}
+    for mid in meter_ids:
+        entry = _kw_cache.get((mid, window_s))
+        if entry is not None and entry[0] > now_mono:
+            cached[mid] = entry[1]
+    missing = [mid for mid in meter_ids if mid not in cached]
+    if missing:
+        fresh = await _query_recent_power(db, missing, window)
+        expires = time.monotonic() + _kw_cache_ttl(window)
+        for mid, kw in fresh.items():
+            _kw_cache[(mid, window_s)] = (expires, kw)
+        cached.update(fresh)
+    return {mid: cached[mid] for mid in meter_ids}
+
+
+async def _query_recent_power(
+    db: AsyncSession, meter_ids: List[str], window: timedelta
+) -> Dict[str, float | None]:
+    """Uncached body of get_recent_power_for_meters."""
+    start_time = _local_wall(datetime.now(timezone.utc) - window)  # naive for SQLite comparison
+
+    if SQL_WINDOW_FUNCTIONS:
+        # One grouped aggregate: a row per meter instead of every reading
+        by_meter_kw = await _recent_power_sql(
+            db, RawReading.meter_id.in_(meter_ids), RawReading.timestamp >= start_time
+        )
+        return {mid: by_meter_kw.get(mid) for mid in meter_ids}
+
+    q = (
+        select(RawReading.meter_id, RawReading.timestamp, RawReading.cumulative_kwh)
+        .where(
+            RawReading.meter_id.in_(meter_ids),
+            RawReading.timestamp >= start_time,
+        )
+        .order_by(RawReading.meter_id, RawReading.timestamp)
     )
-    if total_hours > 0:
-        return total_kwh / total_hours
-    # Single interval: use its kw directly
-    if len(points) == 1:
-        return points[0].kw
-    return None
+    accs: Dict[str, KwAccumulator] = defaultdict(KwAccumulator)
+    result = await db.stream(q.execution_options(yield_per=STREAM_CHUNK_ROWS))
+    async for rows in result.partitions():
+        for meter_id, run in groupby(rows, key=attrgetter("meter_id")):
+            accs[meter_id].feed(list(run))
+    return {mid: accs[mid].average_kw() if mid in accs else None for mid in meter_ids}
+
+
+# Rows per partition when streaming readings (yield_per); bounds the working set
+STREAM_CHUNK_ROWS = 1000
+
+
+class KwAccumulator:
+    """Average kW across the valid intervals of one meter's time-ordered readings,
+    fed in chunks.
+
+    Keeps the last reading of each chunk so the interval spanning two chunks
+    is not lost; memory is bounded by the chunk size, not the window.
+    """
+
+    def __init__(self) -> None:
+        self._last = None
+        self.n_readings = 0
+        self.n_kept = 0
+        self.total_kwh = 0.0
+        self._first_end: datetime | None = None
+        self._last_end: datetime | None = None
+        self._first_kw: float | None = None
+
+    def feed(self, rows: List[Row]) -> None:
+        if not rows:
+            return
+        self.n_readings += len(rows)
+        chunk = rows if self._last is None else [self._last, *rows]
+        self._last = rows[-1]
+        if len(chunk) < 2:
+            return
+        timestamps, _, delta_kwh, kw, keep = _interval_arrays(chunk)
+        if len(keep) == 0:
+            return
+        if self.n_kept == 0:
+            self._first_end = timestamps[keep[0] + 1]
+            self._first_kw = float(kw[keep[0]])
+        self._last_end = timestamps[keep[-1] + 1]
+        self.n_kept += len(keep)
+        self.total_kwh += float(delta_kwh[keep].sum())
+
+    def average_kw(self) -> float | None:
+        if self.n_kept == 0:
+            return None
+        if self.n_kept == 1:
+            # Single interval: use its kw directly
+            return self._first_kw
+        # Time spanned by the kept interval end points (first to last). Via the
+        # epoch: subtracting two datetimes in the same zone ignores DST shifts.
+        span = (self._last_end - _EPOCH_UTC) - (self._first_end - _EPOCH_UTC)
+        total_hours = span.total_seconds() / 3600.0
+        if total_hours > 0:
+            return self.total_kwh / total_hours
+        return None
+
+
+def _local_wall(dt: datetime) -> datetime:
+    """Naive wall-clock time in the local zone, as stored by SQLite."""
+    return dt.astimezone(get_local_tz()).replace(tzinfo=None)
 
 
-def _ensure_local(dt: datetime) -> datetime:
-    """Normalize to timezone-aware; SQLite stores local time, treat naive as local."""
-    if dt.tzinfo is None:
-        return dt.replace(tzinfo=datetime.now().astimezone().tzinfo)
-    return dt
+def _local_timestamps(readings: Iterable[RawReading]) -> List[datetime]:
+    """Timezone-aware reading timestamps; SQLite stores local time, treat naive
+    as local (get_local_tz).
+
+    The zone is looked up once per call rather than per row. It is not cached
+    across calls: without POWER_MONITOR_TZ it is a fixed offset, which goes
+    stale at DST changes.
+    """
+    local_tz = get_local_tz()
+    return [
+        ts if ts.tzinfo else ts.replace(tzinfo=local_tz)
+        for ts in map(attrgetter("timestamp"), readings)
+    ]
 
 
 # Sanity limits: skip intervals that imply impossible consumption
@@ -68,74 +230,515 @@ MAX_DELTA_KWH = 100.0  # > 100 kWh in one interval is suspicious
 MAX_KW = 500.0  # > 500 kW sustained is impossible for residential
 
 
-def compute_intervals(readings: Iterable[RawReading]) -> List[IntervalPoint]:
-    """Convert cumulative readings into interval energy/power points."""
-    readings_list = list(readings)
-    points: List[IntervalPoint] = []
-    for prev, cur in zip(readings_list, readings_list[1:]):
-        prev_ts = _ensure_local(prev.timestamp)
-        cur_ts = _ensure_local(cur.timestamp)
-        dt_h = (cur_ts - prev_ts).total_seconds() / 3600.0
-        if dt_h <= 0:
-            continue
-        delta_kwh = cur.cumulative_kwh - prev.cumulative_kwh
-        if delta_kwh < 0:
-            continue
+_ONE_US = timedelta(microseconds=1)
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _interval_arrays(
+    readings: List[RawReading],
+) -> Tuple[List[datetime], np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Vectorized interval math over time-ordered readings.
+
+    Returns (local timestamps, microseconds since the first reading, per-interval
+    delta_kwh, per-interval kw, indices of the intervals that pass the sanity
+    limits). Interval i runs from reading i to reading i + 1.
+    """
+    timestamps = _local_timestamps(readings)
+    # Offsets from the epoch rather than from the first reading: datetimes
+    # sharing a zone (such as a configured ZoneInfo) subtract as wall clock
+    epoch_us = np.fromiter(
+        ((ts - _EPOCH_UTC) // _ONE_US for ts in timestamps), dtype=np.int64, count=len(timestamps)
+    )
+    elapsed_us = epoch_us - epoch_us[0]
+    kwh = np.fromiter(
+        (r.cumulative_kwh for r in readings), dtype=np.float64, count=len(readings)
+    )
+    delta_kwh = np.diff(kwh)
+    dt_h = np.diff(elapsed_us) / 1e6 / 3600.0
+    with np.errstate(divide="ignore", invalid="ignore"):
         kw = delta_kwh / dt_h
-        if delta_kwh > MAX_DELTA_KWH or kw > MAX_KW:
-            continue  # Skip anomalous intervals (rollover, corruption)
-        points.append(
-            IntervalPoint(
-                timestamp=cur_ts,
-                delta_kwh=delta_kwh,
-                kw=kw,
+    # NaN/inf from zero-length intervals fail these comparisons and are dropped
+    keep = np.flatnonzero(
+        (dt_h > 0) & (delta_kwh >= 0) & (delta_kwh <= MAX_DELTA_KWH) & (kw <= MAX_KW)
+    )
+    return timestamps, elapsed_us, delta_kwh, kw, keep
+
+
+def compute_intervals(readings: Iterable[RawReading]) -> List[IntervalPoint]:
+    """Convert cumulative readings into interval energy/power points.
+
+    Accepts RawReading instances or any rows with ``timestamp`` and
+    ``cumulative_kwh`` attributes (e.g. Core result rows). Intervals that are
+    zero-length, negative, or beyond the sanity limits (rollover, corruption)
+    are skipped.
+    """
+    readings_list = readings if isinstance(readings, list) else list(readings)
+    if len(readings_list) < 2:
+        return []
+    timestamps, _, delta_kwh, kw, keep = _interval_arrays(readings_list)
+    return [
+        IntervalPoint(timestamp=timestamps[i + 1], delta_kwh=d, kw=k)
+        for i, d, k in zip(keep.tolist(), delta_kwh[keep].tolist(), kw[keep].tolist())
+    ]
+
+
+def compute_interval_arrays(
+    readings: Iterable[RawReading],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Struct-of-arrays form of compute_intervals, for bucketing.
+
+    Returns (end_us, utc_offset_s, delta_kwh, kw) for the kept intervals: each
+    interval's end as int64 epoch microseconds, the UTC offset (seconds) of its
+    local timestamp, and its energy and power.
+    """
+    readings_list = readings if isinstance(readings, list) else list(readings)
+    if len(readings_list) < 2:
+        empty_i, empty_f = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        return empty_i, empty_i, empty_f, empty_f
+    timestamps, elapsed_us, delta_kwh, kw, keep = _interval_arrays(readings_list)
+    ends = keep + 1
+    fixed_offsets: Dict[tzinfo, int] = {}
+
+    def _offset_s(ts: datetime) -> int:
+        offset_s = fixed_offsets.get(ts.tzinfo)
+        if offset_s is None:
+            offset_s = int(ts.utcoffset().total_seconds())
+            if type(ts.tzinfo) is timezone:
+                fixed_offsets[ts.tzinfo] = offset_s
+        return offset_s
+
+    first_us = (timestamps[0] - _EPOCH_UTC) // _ONE_US
+    utc_offset_s = np.fromiter(
+        (_offset_s(timestamps[i]) for i in ends.tolist()), dtype=np.int64, count=len(ends)
+    )
+    return first_us + elapsed_us[ends], utc_offset_s, delta_kwh[keep], kw[keep]
+
+
+# Map resolution string to bucket size in minutes; anything else is "raw"
+RESOLUTION_MINUTES = {
+    "1m": 1,
+    "5m": 5,
+    "15m": 15,
+    "1h": 60,
+    "1d": 24 * 60,
+}
+
+# LAG() needs window function support (SQLite 3.25+); older builds fall back
+# to the Python interval math (_interval_arrays and friends)
+SQL_WINDOW_FUNCTIONS = sqlite3.sqlite_version_info >= (3, 25, 0)
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _interval_steps(*conditions):
+    """Subquery of per-reading steps: each row's delta_kwh and dt_h since the
+    previous reading of the same meter (NULL for the first), as in _interval_arrays.
+    """
+    ts = RawReading.timestamp
+    window = {"partition_by": RawReading.meter_id, "order_by": (ts, RawReading.cumulative_raw)}
+    # julianday() honours the offset suffix, so durations match aware datetimes
+    dt_h = (func.julianday(ts) - func.julianday(func.lag(ts).over(**window))) * 24.0
+    return (
+        select(
+            RawReading.meter_id.label("meter_id"),
+            ts.label("timestamp"),
+            (RawReading.cumulative_kwh - func.lag(RawReading.cumulative_kwh).over(**window)).label(
+                "delta_kwh"
+            ),
+            cast(dt_h, Float).label("dt_h"),
+        )
+        .where(*conditions)
+        .subquery()
+    )
+
+
+def _valid_step(steps):
+    """Same sanity filters as _interval_arrays. NULL (not true) for each meter's
+    first row, so CASE WHEN on it drops those rows from aggregates."""
+    return and_(
+        steps.c.dt_h > 0,
+        steps.c.delta_kwh >= 0,
+        steps.c.delta_kwh <= MAX_DELTA_KWH,
+        steps.c.delta_kwh / steps.c.dt_h <= MAX_KW,
+    )
+
+
+async def _recent_power_sql(db: AsyncSession, *conditions) -> Dict[str, float | None]:
+    """KwAccumulator.average_kw per meter computed inside SQLite; one row per meter comes back."""
+    steps = _interval_steps(*conditions)
+    kept = _valid_step(steps)
+    end_jd = func.julianday(steps.c.timestamp)
+    q = select(
+        steps.c.meter_id,
+        func.count(case((kept, 1), else_=None)),
+        func.sum(case((kept, steps.c.delta_kwh), else_=None)),
+        func.sum(case((kept, steps.c.dt_h), else_=None)),
+        func.min(case((kept, end_jd), else_=None)),
+        func.max(case((kept, end_jd), else_=None)),
+    ).group_by(steps.c.meter_id)
+    out: Dict[str, float | None] = {}
+    for meter_id, n_kept, total_kwh, kept_h, first_jd, last_jd in (await db.execute(q)).all():
+        if not n_kept:
+            out[meter_id] = None
+        elif n_kept == 1:
+            # Single interval: use its kw directly
+            out[meter_id] = total_kwh / kept_h
+        else:
+            total_hours = (last_jd - first_jd) * 24.0
+            out[meter_id] = total_kwh / total_hours if total_hours > 0 else None
+    return out
+
+
+def _wall_bucket(ts, bucket_s: int):
+    """Bucket start (epoch seconds of the stored wall clock) of a timestamp column.
+
+    Floors on the first 19 chars, as bucket_interval_arrays does on the local
+    wall clock. Timestamps written by import_csv.py keep their UTC offset
+    suffix; collector ones are naive local time.
+    """
+    wall_s = cast(func.strftime("%s", func.substr(ts, 1, 19)), Integer)
+    return wall_s // bucket_s * bucket_s
+
+
+def _tz_suffix(ts):
+    """The "+HH:MM"/"-HH:MM" suffix of a stored timestamp, NULL if naive."""
+    return cast(
+        case(
+            (func.substr(ts, -6, 1).in_(("+", "-")), func.substr(ts, -6)),
+            else_=None,
+        ),
+        String,
+    )
+
+
+# Granularity of the intervals rollup; coarser resolutions group its rows
+ROLLUP_BUCKET_S = 60
+
+# Rollup rows keep the raw rows' stored form: date, their separator (" " from
+# the collector, "T" from import_csv.py), time with fraction, then the offset
+# suffix if they had one. Range filters then compare against bound datetimes
+# exactly as they do on raw_readings.timestamp.
+_ROLLUP_DATE_FORMAT = "%Y-%m-%d"
+_ROLLUP_TIME_FORMAT = "%H:%M:%S.000000"
+
+
+def _rollup_ts(epoch_s, sep, suffix):
+    return (
+        func.strftime(_ROLLUP_DATE_FORMAT, epoch_s, "unixepoch")
+        .concat(sep)
+        .concat(func.strftime(_ROLLUP_TIME_FORMAT, epoch_s, "unixepoch"))
+        .concat(suffix)
+    )
+
+
+async def refresh_rollup(
+    db: AsyncSession,
+    since: Dict[str, Optional[datetime]],
+    until: Optional[date] = None,
+) -> None:
+    """Bring the 1-minute intervals rollup up to date for the given meters.
+
+    Each meter is rebuilt from its newest rollup row on, or from the minute
+    of ``since[meter_id]`` if that is earlier (readings arriving out of
+    order). Deleting a meter's rows from some point on therefore makes the
+    next refresh recompute everything after it. With ``until``, only
+    readings before that local date are rolled up; a later call continues
+    from there. Runs in the caller's transaction; the DELETE comes first so
+    the write lock is taken before anything is read.
+    """
+    for meter_id, since_ts in since.items():
+        newest = (
+            select(func.max(Interval.start_ts))
+            .where(Interval.meter_id == meter_id)
+            .scalar_subquery()
+        )
+        rebuild_from = newest
+        if since_ts is not None:
+            # " " sorts before "T", so this also covers import rows of that minute
+            since_text = since_ts.strftime("%Y-%m-%d %H:%M:00.000000")
+            rebuild_from = func.min(since_text, func.coalesce(newest, since_text))
+        await db.execute(
+            delete(Interval.__table__).where(
+                Interval.meter_id == meter_id,
+                type_coerce(Interval.start_ts, String) >= rebuild_from,
+            )
+        )
+        # Everything after the newest remaining row is rebuilt. Raw rows from
+        # the reading before it on are a suffix of the meter's LAG order, so
+        # their steps match a full-history pass.
+        kept_until = (
+            await db.execute(
+                select(type_coerce(func.max(Interval.start_ts), String)).where(
+                    Interval.meter_id == meter_id
+                )
             )
+        ).scalar()
+        conditions = [RawReading.meter_id == meter_id]
+        if kept_until is not None:
+            prev = (
+                await db.execute(
+                    select(type_coerce(func.max(RawReading.timestamp), String)).where(
+                        RawReading.meter_id == meter_id,
+                        type_coerce(RawReading.timestamp, String) <= kept_until,
+                    )
+                )
+            ).scalar()
+            if prev is not None:
+                conditions.append(type_coerce(RawReading.timestamp, String) >= prev)
+        if until is not None:
+            # Date prefix: sorts after every stored form of the previous day
+            conditions.append(type_coerce(RawReading.timestamp, String) < until.isoformat())
+        steps = _interval_steps(*conditions)
+        bucket = _wall_bucket(steps.c.timestamp, ROLLUP_BUCKET_S).label("bucket")
+        sep = func.substr(steps.c.timestamp, 11, 1)
+        suffix = func.coalesce(_tz_suffix(steps.c.timestamp), "")
+        minutes = (
+            select(
+                steps.c.meter_id.label("meter_id"),
+                _rollup_ts(bucket, sep, suffix).label("start_ts"),
+                _rollup_ts(bucket + ROLLUP_BUCKET_S, sep, suffix).label("end_ts"),
+                func.sum(case((_valid_step(steps), steps.c.delta_kwh), else_=None)).label("kwh"),
+            )
+            .group_by(steps.c.meter_id, bucket, sep, suffix)
+            .subquery()
+        )
+        rows = select(
+            minutes.c.meter_id,
+            minutes.c.start_ts,
+            minutes.c.end_ts,
+            minutes.c.kwh,
+            minutes.c.kwh * (3600.0 / ROLLUP_BUCKET_S),
+        ).where(minutes.c.kwh.is_not(None))
+        if kept_until is not None:
+            rows = rows.where(minutes.c.start_ts > kept_until)
+        await db.execute(
+            insert(Interval.__table__).from_select(
+                ["meter_id", "start_ts", "end_ts", "delta_kwh", "avg_kw"], rows
+            )
+        )
+
+
+def _date_prefix(ts):
+    """The "YYYY-MM-DD" of stored timestamp text (local date as written)."""
+    return func.substr(type_coerce(ts, String), 1, 10)
+
+
+async def _rollup_days(
+    db: AsyncSession, meter_id: str, since: Optional[datetime]
+) -> Optional[Tuple[date, date]]:
+    """First and last local date refresh_rollup would rebuild for a meter,
+    or None if it has no readings."""
+    newest_minute, first_reading, last_reading = (
+        await db.execute(
+            select(
+                select(_date_prefix(func.max(Interval.start_ts)))
+                .where(Interval.meter_id == meter_id)
+                .scalar_subquery(),
+                select(_date_prefix(func.min(RawReading.timestamp)))
+                .where(RawReading.meter_id == meter_id)
+                .scalar_subquery(),
+                select(_date_prefix(func.max(RawReading.timestamp)))
+                .where(RawReading.meter_id == meter_id)
+                .scalar_subquery(),
+            )
+        )
+    ).one()
+    if last_reading is None:
+        return None
+    first = first_reading if newest_minute is None else newest_minute
+    if newest_minute is not None and since is not None:
+        first = min(first, since.strftime("%Y-%m-%d"))
+    return date.fromisoformat(first), date.fromisoformat(last_reading)
+
+
+async def catch_up_rollup(
+    db: AsyncSession, since: Dict[str, Optional[datetime]]
+) -> None:
+    """refresh_rollup in short transactions: one per meter and local day.
+
+    A long history (first backfill, or after an import invalidated it) would
+    otherwise hold the write lock for minutes and make collector batches time
+    out. The session must not be in a transaction; each chunk is committed,
+    so a failure keeps the days already done. Where the meter's rollup ends
+    is re-read before every chunk, so days another process (the API's
+    backfill, the collector) has rolled up meanwhile are skipped, not redone.
+    """
+    for meter_id, since_ts in since.items():
+        day: Optional[date] = None
+        while True:
+            async with db.begin():
+                days = await _rollup_days(db, meter_id, since_ts)
+            if days is None:
+                break
+            first, last = days
+            day = first if day is None else max(day, first)
+            if day > last:
+                break
+            until = day + timedelta(days=1)
+            async with db.begin():
+                await refresh_rollup(db, {meter_id: since_ts}, until)
+            # Only the first chunk rebuilds from since; later ones continue
+            since_ts = None
+            day = until
+
+
+def _reading_meters():
+    """CTE of the meter IDs that have raw readings (with one trailing NULL).
+
+    Walks the primary key with one index seek per meter instead of a GROUP
+    BY or DISTINCT scan of every reading; all in a single statement.
+    Readings can exist without a meters row, so the meters table is not
+    enough here.
+    """
+    meters = select(func.min(RawReading.meter_id).label("meter_id")).cte(
+        "reading_meters", recursive=True
+    )
+    next_id = (
+        select(func.min(RawReading.meter_id))
+        .where(RawReading.meter_id > meters.c.meter_id)
+        .scalar_subquery()
+    )
+    return meters.union_all(select(next_id).where(meters.c.meter_id.is_not(None)))
+
+
+def _wall_minute(ts):
+    """First 16 chars of stored text with a " " separator, so collector rows,
+    import rows ("T") and rollup rows built from either compare as wall-clock
+    minutes."""
+    return func.replace(func.substr(ts, 1, 16), "T", " ")
+
+
+async def stale_rollup_meters(
+    db: AsyncSession, meter_ids: Optional[List[str]] = None, lag_minutes: int = 0
+) -> List[str]:
+    """Meters whose newest reading is more than ``lag_minutes`` past their
+    newest rollup minute, e.g. after an import deleted rollup rows or before
+    the first backfill. Only ``meter_ids`` are checked, if given."""
+    meters = _reading_meters()
+    newest_reading = (
+        select(type_coerce(func.max(RawReading.timestamp), String))
+        .where(RawReading.meter_id == meters.c.meter_id)
+        .scalar_subquery()
+    )
+    newest_minute = (
+        select(type_coerce(func.max(Interval.start_ts), String))
+        .where(Interval.meter_id == meters.c.meter_id)
+        .scalar_subquery()
+    )
+    caught_up_to = _wall_minute(newest_minute)
+    if lag_minutes:
+        caught_up_to = func.substr(
+            func.datetime(caught_up_to, f"+{lag_minutes} minutes"), 1, 16
+        )
+    q = select(meters.c.meter_id).where(
+        meters.c.meter_id.is_not(None),
+        or_(newest_minute.is_(None), _wall_minute(newest_reading) > caught_up_to),
+    )
+    if meter_ids:
+        q = q.where(meters.c.meter_id.in_(meter_ids))
+    return list((await db.execute(q)).scalars().all())
+
+
+async def bucket_usage_sql(
+    db: AsyncSession,
+    meter_ids: Optional[List[str]],
+    start: datetime,
+    end: datetime,
+    resolution: str,
+) -> Dict[str, List[Tuple[datetime, float, float]]]:
+    """Bucket interval energy per meter from the 1-minute intervals rollup.
+
+    Same result as compute_interval_arrays + bucket_interval_arrays for a
+    resolution (up to float summation order), reading one row per meter
+    minute instead of every reading. The range is applied to rollup minutes,
+    so the first bucket counts whole minutes from ``start``. Returns
+    {meter_id: [(bucket_start, kwh, kw), ...]} in meter_id order, including
+    meters that have readings but no valid intervals.
+    """
+    bucket_s = RESOLUTION_MINUTES[resolution] * 60
+    start_ts = type_coerce(Interval.start_ts, String)
+    conditions = [Interval.start_ts >= start, Interval.start_ts <= end]
+    if meter_ids:
+        conditions.append(Interval.meter_id.in_(meter_ids))
+    bucket = _wall_bucket(start_ts, bucket_s).label("bucket")
+    tz_suffix = _tz_suffix(start_ts).label("tz_suffix")
+    q = (
+        select(Interval.meter_id, bucket, tz_suffix, func.sum(Interval.delta_kwh))
+        .where(*conditions)
+        .group_by(Interval.meter_id, bucket, tz_suffix)
+        .order_by(Interval.meter_id, bucket)
+    )
+    tz_by_suffix: Dict[Optional[str], tzinfo] = {None: get_local_tz()}
+    hours = bucket_s / 3600.0
+    # Meters with readings in range but no rollup rows still get a series
+    meters = _reading_meters()
+    in_range = (
+        select(RawReading.meter_id)
+        .where(
+            RawReading.meter_id == meters.c.meter_id,
+            RawReading.timestamp >= start,
+            RawReading.timestamp <= end,
         )
-    return points
+        .exists()
+    )
+    with_readings = (
+        select(meters.c.meter_id)
+        .where(meters.c.meter_id.is_not(None), in_range)
+        .order_by(meters.c.meter_id)
+    )
+    if meter_ids:
+        with_readings = with_readings.where(meters.c.meter_id.in_(meter_ids))
+    out: Dict[str, List[Tuple[datetime, float, float]]] = {
+        meter_id: [] for meter_id in (await db.execute(with_readings)).scalars()
+    }
+    for meter_id, bucket_wall_s, suffix, kwh in (await db.execute(q)).all():
+        tz = tz_by_suffix.get(suffix)
+        if tz is None:
+            tz = tz_by_suffix[suffix] = datetime.strptime(suffix, "%z").tzinfo
+        out.setdefault(meter_id, []).append(
+            ((_EPOCH + timedelta(seconds=bucket_wall_s)).replace(tzinfo=tz), kwh, kwh / hours)
+        )
+    for series in out.values():
+        # Rows with different offsets can interleave; order by instant like bucket_interval_arrays
+        series.sort(key=lambda b: b[0])
+    return out
 
 
 def bucket_intervals(
     points: Iterable[IntervalPoint], resolution: str
 ) -> List[Tuple[datetime, float, float]]:
-    """Aggregate interval points into time buckets.
+    """Interval points (as from compute_intervals) as (timestamp, kwh, kw) rows,
+    for "raw" and any resolution not in RESOLUTION_MINUTES.
 
-    Returns list of (bucket_start, kwh, kw).
+    Bucketed resolutions go through bucket_interval_arrays or bucket_usage_sql.
     """
-    if resolution == "raw":
-        return [(p.timestamp, p.delta_kwh, p.kw) for p in points]
-
-    # Map resolution string to bucket size in minutes
-    res_minutes = {
-        "1m": 1,
-        "5m": 5,
-        "15m": 15,
-        "1h": 60,
-        "1d": 24 * 60,
-    }.get(resolution, 0)
-
-    if res_minutes <= 0:
-        return [(p.timestamp, p.delta_kwh, p.kw) for p in points]
-
-    bucket_size = timedelta(minutes=res_minutes)
-    buckets: Dict[datetime, List[IntervalPoint]] = defaultdict(list)
-
-    for p in points:
-        ts = p.timestamp
-        # Floor to bucket start (minutes since midnight for daily buckets)
-        mins_since_midnight = ts.hour * 60 + ts.minute
-        bucket_start = ts - timedelta(
-            minutes=(mins_since_midnight % res_minutes),
-            seconds=ts.second,
-            microseconds=ts.microsecond,
-        )
-        buckets[bucket_start].append(p)
+    return [(p.timestamp, p.delta_kwh, p.kw) for p in points]
 
-    aggregated: List[Tuple[datetime, float, float]] = []
-    for bucket_start, bucket_points in sorted(buckets.items()):
-        total_kwh = sum(bp.delta_kwh for bp in bucket_points)
-        hours = bucket_size.total_seconds() / 3600.0
-        kw = total_kwh / hours if hours > 0 else 0.0
-        aggregated.append((bucket_start, total_kwh, kw))
 
-    return aggregated
+def bucket_interval_arrays(
+    end_us: np.ndarray, utc_offset_s: np.ndarray, delta_kwh: np.ndarray, resolution: str
+) -> List[Tuple[datetime, float, float]]:
+    """Aggregate compute_interval_arrays output into time buckets, for a
+    resolution in RESOLUTION_MINUTES. Returns list of (bucket_start, kwh, kw).
+    """
+    if len(end_us) == 0:
+        return []
+    bucket_s = RESOLUTION_MINUTES[resolution] * 60
+    # Floor on the local wall clock, then key buckets by their start instant
+    wall_s = end_us // 1_000_000 + utc_offset_s
+    bucket = wall_s - wall_s % bucket_s - utc_offset_s
+    starts, first_idx, inverse = np.unique(bucket, return_index=True, return_inverse=True)
+    # bincount adds the weights in input order, same as summing point by point
+    kwh = np.bincount(inverse.reshape(-1), weights=delta_kwh, minlength=len(starts))
 
+    tz_by_offset: Dict[int, tzinfo] = {}
+    hours = bucket_s / 3600.0
+    aggregated: List[Tuple[datetime, float, float]] = []
+    for start_s, offset_s, total_kwh in zip(
+        starts.tolist(), utc_offset_s[first_idx].tolist(), kwh.tolist()
+    ):
+        tz = tz_by_offset.get(offset_s)
+        if tz is None:
+            tz = tz_by_offset[offset_s] = timezone(timedelta(seconds=offset_s))
+        aggregated.append((datetime.fromtimestamp(start_s, tz), total_kwh, total_kwh / hours))
+    return aggregated
@@ -4,62 +4,116 @@ Run from project root:
     cd backend && python3 import_csv.py ../electricusage.csv
 Or with venv on Pi:
     POWER_MONITOR_DB_PATH=../power_monitor.db .venv/bin/python import_csv.py ../electricusage.csv
+To convert a database created before raw_readings became WITHOUT ROWID:
+    python3 import_csv.py --rebuild
+
+The import runs as a single transaction and is the only writer while it runs:
+it creates the same import.lock the API uses, so the collector skips its
+writes until the import finishes. The API's 1-minute usage rollup is not
+rebuilt here: the affected days are dropped from it, and the API reads those
+meters from raw readings until its background refresh has caught them up
+again (no restart needed).
 """
 from __future__ import annotations
 
 import csv
 import os
+import re
 import sqlite3
 import sys
 from datetime import datetime, timezone
 from pathlib import Path
 
+# Rows per executemany() call
+BATCH_SIZE = 10_000
+
+# Clustered on its primary key, matching models.RawReading
+_RAW_READINGS_TABLE = """CREATE TABLE IF NOT EXISTS {name} (
+            meter_id TEXT NOT NULL REFERENCES meters(meter_id),
+            timestamp TIMESTAMP NOT NULL,
+            cumulative_raw INTEGER NOT NULL,
+            cumulative_kwh REAL NOT NULL,
+            source TEXT DEFAULT 'rtlamr',
+            PRIMARY KEY (meter_id, timestamp, cumulative_raw)
+        ) WITHOUT ROWID"""
+
+
+# "<date>T<time>" "." "<fraction digits>" "<offset>", e.g. "...T21:22:23" "665421351" "-05:00"
+_TS_RE = re.compile(r"^([^.]*)\.(\d*)(.*)$")
+
+
 def parse_timestamp(ts_raw: str) -> datetime | None:
     """Parse ISO timestamp; truncate nanoseconds for stdlib fromisoformat."""
     try:
-        # fromisoformat supports up to 6 fractional digits; truncate if longer
-        if "." in ts_raw:
-            base, rest = ts_raw.split(".", 1)
-            # rest may be "665421351-05:00" - extract digits and timezone
-            digits = ""
-            tz_part = ""
-            for c in rest:
-                if c.isdigit():
-                    digits += c
-                else:
-                    tz_part = rest[len(digits) :]
-                    break
-            frac = (digits[:6] + "000000")[:6]  # truncate to 6
-            ts_raw = f"{base}.{frac}{tz_part}"
-        ts = datetime.fromisoformat(ts_raw.replace("Z", "+00:00"))
+        try:
+            # Python 3.11+ accepts "Z" and more than 6 fractional digits directly
+            ts = datetime.fromisoformat(ts_raw)
+        except ValueError:
+            # Older fromisoformat supports up to 6 fractional digits; truncate
+            m = _TS_RE.match(ts_raw)
+            if m is not None:
+                ts_raw = f"{m[1]}.{(m[2] + '000000')[:6]}{m[3]}"
+            ts = datetime.fromisoformat(ts_raw.replace("Z", "+00:00"))
         return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
-    except (ValueError, AttributeError):
+    except (ValueError, TypeError, AttributeError):
         return None
 
 
-def parse_row(row: list[str]) -> tuple[str, datetime, int] | None:
-    """Parse rtlamr CSV row: (meter_id, timestamp, cumulative_raw)."""
-    if len(row) < 8:
-        return None
+def is_without_rowid(conn: sqlite3.Connection) -> bool:
+    table_sql = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'raw_readings'"
+    ).fetchone()[0]
+    return "WITHOUT ROWID" in table_sql.upper()
+
+
+def rebuild_without_rowid(conn: sqlite3.Connection, db_path: Path) -> bool:
+    """Copy a legacy rowid raw_readings table into the clustered layout.
+
+    Dropping the old table also drops its id column, uq_reading,
+    ix_raw_readings_meter_ts and the covering index, which the primary key
+    now replaces. Returns False if the table was already converted.
+    """
+    if is_without_rowid(conn):
+        return False
+    lock_path = db_path.parent / "import.lock"
+    lock_path.touch()
+    conn.isolation_level = None
     try:
-        ts_raw = row[0]
-        meter_id = str(row[3])
-        cumulative_raw = int(row[7])
-        timestamp = parse_timestamp(ts_raw)
-        if timestamp is None:
-            return None
-        return (meter_id, timestamp, cumulative_raw)
-    except (ValueError, IndexError):
-        return None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DROP TABLE IF EXISTS raw_readings_new")
+            conn.execute(_RAW_READINGS_TABLE.format(name="raw_readings_new"))
+            conn.execute(
+                "INSERT OR IGNORE INTO raw_readings_new "
+                "(meter_id, timestamp, cumulative_raw, cumulative_kwh, source) "
+                "SELECT meter_id, timestamp, cumulative_raw, cumulative_kwh, source "
+                "FROM raw_readings ORDER BY meter_id, timestamp, cumulative_raw"
+            )
+            conn.execute("DROP TABLE raw_readings")
+            conn.execute("ALTER TABLE raw_readings_new RENAME TO raw_readings")
+            conn.execute(
+                "CREATE INDEX ix_raw_readings_timestamp ON raw_readings(timestamp)"
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        lock_path.unlink(missing_ok=True)
+    # Return the old table's pages to the filesystem
+    conn.execute("VACUUM")
+    return True
 
 
 def main() -> None:
-    if len(sys.argv) < 2:
-        print("Usage: python import_csv.py <path-to-csv>")
+    rebuild = "--rebuild" in sys.argv[1:]
+    args = [a for a in sys.argv[1:] if a != "--rebuild"]
+    if not args and not rebuild:
+        print("Usage: python import_csv.py [--rebuild] [<path-to-csv>]")
         print("Example: python import_csv.py ../electricusage.csv")
         sys.exit(1)
-    csv_path = Path(sys.argv[1]).resolve()
-    if not csv_path.is_file():
+    csv_path = Path(args[0]).resolve() if args else None
+    if csv_path is not None and not csv_path.is_file():
         print(f"Error: File not found: {csv_path}")
         sys.exit(1)
 
@@ -69,6 +123,12 @@ def main() -> None:
     db_path = db_path.resolve()
 
     conn = sqlite3.connect(str(db_path))
+    # Same settings as the app's connections (database.py); WAL with NORMAL
+    # syncs only at checkpoints, so a large import is not fsync-bound
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-65536")  # 64 MB page cache
     conn.executescript("""
         CREATE TABLE IF NOT EXISTS meters (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -77,49 +137,134 @@ def main() -> None:
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             active INTEGER DEFAULT 1
         );
-        CREATE TABLE IF NOT EXISTS raw_readings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            meter_id TEXT NOT NULL REFERENCES meters(meter_id),
-            timestamp TIMESTAMP NOT NULL,
-            cumulative_raw INTEGER NOT NULL,
-            cumulative_kwh REAL NOT NULL,
-            source TEXT DEFAULT 'rtlamr',
-            UNIQUE(meter_id, timestamp, cumulative_raw)
-        );
-        CREATE INDEX IF NOT EXISTS ix_raw_readings_meter_ts ON raw_readings(meter_id, timestamp);
-    """)
+        {readings_table};
+        CREATE INDEX IF NOT EXISTS ix_raw_readings_timestamp ON raw_readings(timestamp);
+    """.format(readings_table=_RAW_READINGS_TABLE.format(name="raw_readings")))
+
+    if rebuild:
+        if rebuild_without_rowid(conn, db_path):
+            print("Rebuilt raw_readings as a WITHOUT ROWID table")
+        else:
+            print("raw_readings is already a WITHOUT ROWID table")
+        if csv_path is None:
+            conn.execute("ANALYZE")
+            conn.close()
+            return
+
+    # Legacy rowid tables (created before WITHOUT ROWID) need a covering index
+    # for per-meter range scans; the clustered table already is one
+    if not is_without_rowid(conn):
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_raw_readings_cover "
+            "ON raw_readings (meter_id, timestamp, cumulative_kwh)"
+        )
 
     seen_meters: set[str] = set()
+    # Earliest inserted timestamp per meter, for invalidating the rollup
+    first_ts: dict[str, str] = {}
+    # (meter_id, timestamp, cumulative_raw) keys already stored or queued, so
+    # duplicates (re-imports, repeated rtlamr lines) never reach SQLite
+    seen: set[tuple[str, str, int]] = set()
     inserted = 0
     skipped = 0
+    batch: list[tuple[str, str, int, int]] = []
 
-    with open(csv_path, "r", encoding="utf-8") as f:
-        reader = csv.reader(f)
-        for row in reader:
-            parsed = parse_row(row)
-            if parsed is None:
-                continue
-            meter_id, timestamp, cumulative_raw = parsed
-            cumulative_kwh = cumulative_raw / 100.0
-
-            if meter_id not in seen_meters:
-                conn.execute(
-                    "INSERT OR IGNORE INTO meters (meter_id, label, active) VALUES (?, ?, 1)",
-                    (meter_id, None),
-                )
-                seen_meters.add(meter_id)
+    def flush() -> None:
+        nonlocal inserted, skipped
+        # OR IGNORE skips duplicates without raising; rowcount counts the new rows.
+        # SQLite derives cumulative_kwh from the raw value passed a second time.
+        cur = conn.executemany(
+            """INSERT OR IGNORE INTO raw_readings (meter_id, timestamp, cumulative_raw, cumulative_kwh, source)
+               VALUES (?, ?, ?, ? / 100.0, 'rtlamr')""",
+            batch,
+        )
+        inserted += cur.rowcount
+        skipped += len(batch) - cur.rowcount
+        batch.clear()
+
+    # Pause the collector for the duration, as uploads through the API do: it
+    # skips writes while this file exists, so the import is the only writer
+    lock_path = db_path.parent / "import.lock"
+    lock_path.touch()
+    # Manage the transaction explicitly: one BEGIN/COMMIT for the whole file.
+    # IMMEDIATE takes the write lock up front rather than at the first insert.
+    conn.isolation_level = None
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            with open(csv_path, "r", encoding="utf-8", newline="", buffering=1 << 20) as f:
+                for row in csv.reader(f):
+                    # rtlamr CSV: 0 timestamp, 3 meter_id, 7 cumulative_raw
+                    if len(row) < 8:
+                        continue
+                    try:
+                        cumulative_raw = int(row[7])
+                    except ValueError:
+                        continue
+                    timestamp = parse_timestamp(row[0])
+                    if timestamp is None:
+                        continue
+                    meter_id = row[3]
+                    ts = timestamp.isoformat()
+
+                    if meter_id not in seen_meters:
+                        conn.execute(
+                            "INSERT OR IGNORE INTO meters (meter_id, label, active) VALUES (?, ?, 1)",
+                            (meter_id, None),
+                        )
+                        seen_meters.add(meter_id)
+                        # Exports are chronological, so only stored rows from this
+                        # meter's first timestamp on can collide, and only ones in
+                        # import form ("T" separator and offset, like ts): collector
+                        # rows are naive "YYYY-MM-DD HH:MM:SS" text and never equal
+                        # a key. Loading just those keeps memory bounded on large
+                        # databases; anything else that collides is still dropped
+                        # by OR IGNORE.
+                        seen.update(
+                            (meter_id, stored_ts, stored_raw)
+                            for stored_ts, stored_raw in conn.execute(
+                                "SELECT timestamp, cumulative_raw FROM raw_readings "
+                                "WHERE meter_id = ? AND timestamp >= ? "
+                                "AND substr(timestamp, 11, 1) = 'T'",
+                                (meter_id, ts),
+                            )
+                        )
 
-            try:
-                conn.execute(
-                    """INSERT INTO raw_readings (meter_id, timestamp, cumulative_raw, cumulative_kwh, source)
-                       VALUES (?, ?, ?, ?, 'rtlamr')""",
-                    (meter_id, timestamp.isoformat(), cumulative_raw, cumulative_kwh),
+                    key = (meter_id, ts, cumulative_raw)
+                    if key in seen:
+                        skipped += 1
+                        continue
+                    seen.add(key)
+                    first = first_ts.get(meter_id)
+                    if first is None or ts < first:
+                        first_ts[meter_id] = ts
+                    batch.append((meter_id, ts, cumulative_raw, cumulative_raw))
+                    if len(batch) >= BATCH_SIZE:
+                        flush()
+            if batch:
+                flush()
+            # The API's 1-minute intervals rollup is stale from the first
+            # imported day on. Dropping those rows marks the meters stale, so
+            # the API serves them from raw readings and rebuilds them in the
+            # background (this script has no copy of the rollup SQL)
+            if first_ts and conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'intervals'"
+            ).fetchone():
+                conn.executemany(
+                    "DELETE FROM intervals WHERE meter_id = ? AND start_ts >= ?",
+                    [(meter_id, ts[:10]) for meter_id, ts in first_ts.items()],
                 )
-                inserted += 1
-            except sqlite3.IntegrityError:
-                skipped += 1
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            conn.close()
+            raise
+    finally:
+        lock_path.unlink(missing_ok=True)
 
-    conn.commit()
+    # Refresh planner statistics so the range scans pick the right index
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA optimize")
     conn.close()
     print(f"Import complete: {inserted} readings inserted, {skipped} duplicates skipped")
     print(f"Database: {db_path}")